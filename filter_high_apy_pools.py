@@ -3,11 +3,276 @@
 Script to filter Curve pools with gaugeCrvApy values higher than 10.
 """
 
+import glob
+import hashlib
+import heapq
 import json
+import mmap
 import os
-from typing import Dict, Any, List
+import pickle
+import re
+import sys
+import tempfile
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
 
-def filter_high_apy_pools(file_path: str, all_pools_file_path: str, min_apy: float = 10.0, min_usd_total: float = 1000000.0) -> List[Dict[str, Any]]:
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib parser
+    orjson = None
+
+# Files larger than this are memory-mapped instead of read into a bytes copy
+MMAP_MIN_SIZE = 16 * 1024 * 1024
+
+# Files larger than this are streamed with ijson so memory stays bounded
+STREAM_MIN_SIZE = 256 * 1024 * 1024
+
+# Size of the SHA-256 digest that prefixes each cache file
+CACHE_DIGEST_SIZE = hashlib.sha256().digest_size
+
+# Pool info fields kept in the results, the rest of the gauges entry is dropped
+POOL_INFO_FIELDS = ('type', 'blockchainId', 'poolUrls')
+
+# Pools with BTC or ETH in their name are not USD pools
+EXCLUDED_NAME_RE = re.compile(r'btc|eth', re.IGNORECASE)
+
+def _load_json(file_path: str) -> Any:
+    """Load a JSON file, using orjson for parsing when it is available."""
+    if orjson is None:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_SIZE:
+            return orjson.loads(f.read())
+        # Let orjson parse straight from the page cache
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
+def _dump_json(obj: Any, file_path: str) -> None:
+    """Write obj to a JSON file indented by 2, using orjson when it is available."""
+    if orjson is None:
+        with open(file_path, 'w') as f:
+            json.dump(obj, f, indent=2)
+        return
+    with open(file_path, 'wb') as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+
+def _import_ijson() -> Any:
+    """Import ijson on first use so small inputs never pay for it, or return None."""
+    try:
+        import ijson
+    except ImportError:  # ijson is optional, large inputs are then loaded whole
+        return None
+    return ijson
+
+def _stream_items(file_path: str, path: str, kvitems: bool) -> Iterator[Any]:
+    """Lazily yield the items at a dotted path of a JSON file with ijson."""
+    import ijson
+    with open(file_path, 'rb') as f:
+        if kvitems:
+            yield from ijson.kvitems(f, path, use_float=True)
+        else:
+            yield from ijson.items(f, path + '.item', use_float=True)
+
+def _load_response(file_path: str, path: str, kvitems: bool = False) -> Optional[Iterable[Any]]:
+    """
+    Get the items at a dotted path of a Curve API response file.
+    
+    Args:
+        file_path: Path to the JSON response file
+        path: Dotted path to an object or array (e.g. 'data.poolData')
+        kvitems: Yield (key, value) pairs of an object instead of array elements
+    
+    Returns:
+        Iterable over the items, or None if the response is not successful.
+        Files of STREAM_MIN_SIZE or more are streamed when ijson is installed.
+    """
+    ijson = _import_ijson() if os.path.getsize(file_path) >= STREAM_MIN_SIZE else None
+    if ijson is not None:
+        # Check success and the data key in one pass over the top-level keys
+        success = has_data = False
+        with open(file_path, 'rb') as f:
+            events = ijson.parse(f, use_float=True)
+            for prefix, event, value in events:
+                if prefix != '' or event != 'map_key':
+                    continue
+                if value == 'data':
+                    has_data = True
+                elif value == 'success':
+                    _, event, value = next(events)
+                    if event in ('start_map', 'start_array'):
+                        # A container is truthy when it is not empty
+                        value = next(events)[1] not in ('end_map', 'end_array')
+                    success = bool(value)
+                    if not success:
+                        break
+                if success and has_data:
+                    break
+        if not success or not has_data:
+            return None
+        return _stream_items(file_path, path, kvitems)
+    
+    data = _load_json(file_path)
+    if not data.get('success') or 'data' not in data:
+        return None
+    for key in path.split('.'):
+        data = data[key]
+    return data.items() if kvitems else data
+
+def _code_fingerprint() -> str:
+    """Return a short hash of this script's source, used to key the caches."""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def _load_cached(file_path: str, read: Callable[[str], Any]) -> Any:
+    """
+    Return read(file_path), memoized in a pickle file next to the input.
+    
+    The cache is keyed by the input's mtime and size and by a hash of this
+    script, so it is rebuilt whenever the input or the reader logic
+    changes. The pickle is prefixed with its SHA-256 digest, and a cache
+    that fails the check or does not unpickle is removed and rebuilt.
+    None results are not cached.
+    """
+    st = os.stat(file_path)
+    prefix = f"{file_path}.{read.__name__}."
+    cache_path = f"{prefix}{_code_fingerprint()}.{st.st_mtime_ns}.{st.st_size}.pkl"
+    try:
+        with open(cache_path, 'rb') as f:
+            digest = f.read(CACHE_DIGEST_SIZE)
+            payload = f.read()
+        if hashlib.sha256(payload).digest() != digest:
+            raise ValueError("cache checksum mismatch")
+        return pickle.loads(payload)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # A damaged cache is a miss, remove it so it is rebuilt below
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+    
+    value = read(file_path)
+    if value is None:
+        return None
+    
+    # Drop caches of earlier versions of the input or script, then write the new one
+    for stale_path in glob.glob(glob.escape(prefix) + '*.pkl'):
+        try:
+            os.remove(stale_path)
+        except OSError:
+            pass
+    
+    # Write to a unique temp file so concurrent runs never share one
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(cache_path) + '.',
+            suffix='.tmp',
+            dir=os.path.dirname(os.path.abspath(cache_path))
+        )
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(hashlib.sha256(payload).digest())
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not write cache {cache_path} - {e}", file=sys.stderr)
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return value
+
+def _read_stable_pools(file_path: str) -> Optional[List[Tuple[str, str, List[Any], Dict[str, Any]]]]:
+    """
+    Read the gauges data and keep the pools that can pass the filter.
+    
+    Returns:
+        (name, lowercased swap address, gaugeCrvApy, pool info) of stable
+        pools with CRV rewards, gaugeCrvApy data and no BTC or ETH in their
+        name, or None if the data is invalid. Pool info only holds the
+        POOL_INFO_FIELDS.
+    """
+    gauge_items = _load_response(file_path, 'data', kvitems=True)
+    if gauge_items is None:
+        return None
+    
+    stable_pools = []
+    excluded_name = EXCLUDED_NAME_RE.search
+    
+    # Predicates are ordered cheapest and most selective first
+    for pool_name, pool_info in gauge_items:
+        get = pool_info.get
+        
+        # Check if this is a pool
+        if not get('isPool', False):
+            continue
+        
+        # Only include stable pools (USD pools)
+        if get('type') != 'stable':
+            continue
+        
+        # Exclude pools with BTC or ETH in their name
+        if excluded_name(pool_name):
+            continue
+        
+        # Skip pools with hasNoCrv = true
+        if get('hasNoCrv', False):
+            continue
+        
+        # Check the pool has gaugeCrvApy data
+        gauge_crv_apy = get('gaugeCrvApy')
+        if not gauge_crv_apy or not isinstance(gauge_crv_apy, list) or len(gauge_crv_apy) != 2:
+            continue
+        
+        # Only keep the reported fields
+        reported_info = {key: pool_info[key] for key in POOL_INFO_FIELDS if key in pool_info}
+        
+        # Share the repeated type and chain strings between kept pools
+        reported_info['type'] = sys.intern(reported_info['type'])
+        blockchain_id = reported_info.get('blockchainId')
+        if isinstance(blockchain_id, str):
+            reported_info['blockchainId'] = sys.intern(blockchain_id)
+        
+        stable_pools.append((pool_name, get('swap', '').lower(), gauge_crv_apy, reported_info))
+    
+    return stable_pools
+
+def _read_pool_lookup(all_pools_file_path: str) -> Optional[Dict[str, Tuple[float, float]]]:
+    """Map lowercased pool addresses to (USD total, extra rewards APY), or None if the data is invalid."""
+    pool_items = _load_response(all_pools_file_path, 'data.poolData')
+    if pool_items is None:
+        return None
+    
+    return {
+        pool.get('address', '').lower(): (
+            pool.get('usdTotal', 0),
+            sum((reward.get('apy', 0.0) for reward in pool.get('gaugeRewards') or ()), 0.0)
+        )
+        for pool in pool_items
+    }
+
+@dataclass(slots=True)
+class PoolEntry:
+    """A pool that passed the APY and TVL filters, with the POOL_INFO_FIELDS of its gauges entry."""
+    name: str
+    pool_info: Dict[str, Any]
+    gaugeCrvApy: List[Any]
+    extra_rewards_apy: float
+    total_apy_range: List[float]
+    max_apy: float
+    usd_total: float
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the entry as a dict for JSON output."""
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+def filter_high_apy_pools(file_path: str, all_pools_file_path: str, min_apy: float = 10.0, min_usd_total: float = 1000000.0) -> List[PoolEntry]:
     """
     Filter Curve pools with gaugeCrvApy values higher than the specified minimum and USD total above threshold.
     
@@ -21,76 +286,32 @@ def filter_high_apy_pools(file_path: str, all_pools_file_path: str, min_apy: flo
         List of pools with high APY values and sufficient TVL
     """
     try:
-        # Load gauges data
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+        # Load stable pool candidates from the gauges data
+        stable_pools = _load_cached(file_path, _read_stable_pools)
         
-        if not data.get('success') or 'data' not in data:
+        if stable_pools is None:
             print("Error: Invalid gauges data structure")
             return []
         
-        # Load all pools data
-        with open(all_pools_file_path, 'r') as f:
-            all_pools_data = json.load(f)
+        # Load USD totals and extra rewards from the all pools data
+        pool_lookup = _load_cached(all_pools_file_path, _read_pool_lookup)
         
-        if not all_pools_data.get('success') or 'data' not in all_pools_data:
+        if pool_lookup is None:
             print("Error: Invalid all-pools data structure")
             return []
         
-        # Create a lookup dictionary for pool addresses to USD totals and extra rewards
-        pool_usd_lookup = {}
-        pool_extra_rewards_lookup = {}
-        
-        for pool in all_pools_data['data']['poolData']:
-            address = pool.get('address', '').lower()
-            usd_total = pool.get('usdTotal', 0)
-            pool_usd_lookup[address] = usd_total
-            
-            # Calculate extra rewards APY
-            extra_apy = 0.0
-            gauge_rewards = pool.get('gaugeRewards', [])
-            if gauge_rewards:
-                for reward in gauge_rewards:
-                    extra_apy += reward.get('apy', 0.0)
-            pool_extra_rewards_lookup[address] = extra_apy
-        
-        pools_data = data['data']
         high_apy_pools = []
-        all_pools_with_apy = []
+        nonzero_count = 0
+        top_nonzero_pools = []  # min-heap of the 10 highest max APY pools
         
-        for pool_name, pool_info in pools_data.items():
-            # Check if this is a pool and has gaugeCrvApy data
-            if not pool_info.get('isPool', False):
-                continue
-                
-            gauge_crv_apy = pool_info.get('gaugeCrvApy')
-            if not gauge_crv_apy or not isinstance(gauge_crv_apy, list) or len(gauge_crv_apy) != 2:
-                continue
-            
-            # Skip pools with hasNoCrv = true
-            if pool_info.get('hasNoCrv', False):
-                continue
-            
-            # Only include stable pools (USD pools)
-            if pool_info.get('type') != 'stable':
-                continue
-            
-            # Exclude pools with BTC or ETH in their name
-            pool_name_lower = pool_name.lower()
-            if 'btc' in pool_name_lower or 'eth' in pool_name_lower:
-                continue
-            
-            # Get pool address for lookups
-            pool_address = pool_info.get('swap', '').lower()
-            
+        lookup_pool = pool_lookup.get
+        
+        for index, (pool_name, pool_address, gauge_crv_apy, pool_info) in enumerate(stable_pools):
             # Check USD total value
-            usd_total = pool_usd_lookup.get(pool_address, 0)
+            usd_total, extra_apy = lookup_pool(pool_address, (0, 0.0))
             if usd_total < min_usd_total:
                 continue
             
-            # Get extra rewards APY
-            extra_apy = pool_extra_rewards_lookup.get(pool_address, 0.0)
-            
             # Check if either APY value (CRV + Extra) is higher than the threshold
             # Handle None values properly
             base_apy_0 = gauge_crv_apy[0] if gauge_crv_apy[0] is not None else 0
@@ -98,40 +319,41 @@ def filter_high_apy_pools(file_path: str, all_pools_file_path: str, min_apy: flo
             
             total_apy_0 = base_apy_0 + extra_apy
             total_apy_1 = base_apy_1 + extra_apy
+            max_apy = max(total_apy_0, total_apy_1)
             
             if total_apy_0 > min_apy or total_apy_1 > min_apy:
-                pool_entry = {
-                    'name': pool_name,
-                    'pool_info': pool_info,
-                    'gaugeCrvApy': gauge_crv_apy,
-                    'extra_rewards_apy': extra_apy,
-                    'total_apy_range': [total_apy_0, total_apy_1],
-                    'max_apy': max(total_apy_0, total_apy_1),
-                    'usd_total': usd_total
-                }
-                high_apy_pools.append(pool_entry)
+                high_apy_pools.append(PoolEntry(
+                    name=pool_name,
+                    pool_info=pool_info,
+                    gaugeCrvApy=gauge_crv_apy,
+                    extra_rewards_apy=extra_apy,
+                    total_apy_range=[total_apy_0, total_apy_1],
+                    max_apy=max_apy,
+                    usd_total=usd_total
+                ))
             
-            # Also collect all pools with non-zero APY for analysis
+            # Also count all pools with non-zero APY and keep the top 10 for analysis
             if total_apy_0 > 0 or total_apy_1 > 0:
-                all_pools_with_apy.append({
-                    'name': pool_name,
-                    'gaugeCrvApy': gauge_crv_apy,
-                    'extra_rewards_apy': extra_apy,
-                    'hasNoCrv': pool_info.get('hasNoCrv', False)
-                })
+                nonzero_count += 1
+                # -index keeps the earlier pool on ties
+                item = (max_apy, -index, pool_name, gauge_crv_apy, extra_apy)
+                if len(top_nonzero_pools) < 10:
+                    heapq.heappush(top_nonzero_pools, item)
+                else:
+                    heapq.heappushpop(top_nonzero_pools, item)
         
         # Sort by maximum APY in descending order
-        high_apy_pools.sort(key=lambda x: x['max_apy'], reverse=True)
+        high_apy_pools.sort(key=attrgetter('max_apy'), reverse=True)
         
         # Print summary of all pools with non-zero APY
-        if all_pools_with_apy:
-            print(f"Found {len(all_pools_with_apy)} pools with non-zero APY (CRV + Extra):")
-            for pool in all_pools_with_apy[:10]:  # Show first 10
-                gauge_apy = pool['gaugeCrvApy']
-                extra = pool['extra_rewards_apy']
-                print(f"  {pool['name']}: CRV[{gauge_apy[0]:.2f}%, {gauge_apy[1]:.2f}%] + Extra[{extra:.2f}%]")
-            if len(all_pools_with_apy) > 10:
-                print(f"  ... and {len(all_pools_with_apy) - 10} more")
+        if nonzero_count:
+            lines = [f"Found {nonzero_count} pools with non-zero APY (CRV + Extra):"]
+            # Show the top 10 by maximum APY
+            for _, _, pool_name, gauge_apy, extra in sorted(top_nonzero_pools, reverse=True):
+                lines.append(f"  {pool_name}: CRV[{gauge_apy[0]:.2f}%, {gauge_apy[1]:.2f}%] + Extra[{extra:.2f}%]")
+            if nonzero_count > 10:
+                lines.append(f"  ... and {nonzero_count - 10} more")
+            sys.stdout.write('\n'.join(lines) + '\n')
         else:
             print("No pools found with non-zero APY values")
         
@@ -147,38 +369,43 @@ def filter_high_apy_pools(file_path: str, all_pools_file_path: str, min_apy: flo
         print(f"Error: {e}")
         return []
 
-def print_results(high_apy_pools: List[Dict[str, Any]], min_apy: float = 10.0):
+def print_results(high_apy_pools: List[PoolEntry], min_apy: float = 10.0):
     """Print the results in a formatted way."""
     if not high_apy_pools:
         print(f"No pools found with Total APY > {min_apy}%")
         return
     
-    print(f"Found {len(high_apy_pools)} pools with Total APY > {min_apy}%:")
-    print("=" * 80)
+    # Build the whole report and write it in one go
+    lines = [
+        f"Found {len(high_apy_pools)} pools with Total APY > {min_apy}%:",
+        "=" * 80
+    ]
     
     for i, pool in enumerate(high_apy_pools, 1):
-        pool_info = pool['pool_info']
-        gauge_apy = pool['gaugeCrvApy']
-        extra_apy = pool['extra_rewards_apy']
-        total_apy = pool['total_apy_range']
-        
-        print(f"{i}. {pool['name']}")
-        print(f"   Base CRV APY:   [{gauge_apy[0]:.2f}%, {gauge_apy[1]:.2f}%]")
-        print(f"   Extra APY:      {extra_apy:.2f}%")
-        print(f"   Total APY:      [{total_apy[0]:.2f}%, {total_apy[1]:.2f}%]")
-        print(f"   Max Total APY:  {pool['max_apy']:.2f}%")
-        print(f"   USD Total:      ${pool.get('usd_total', 0):,.2f}")
-        print(f"   Type:           {pool_info.get('type', 'unknown')}")
-        print(f"   Blockchain:     {pool_info.get('blockchainId', 'unknown')}")
+        pool_info = pool.pool_info
+        gauge_apy = pool.gaugeCrvApy
+        extra_apy = pool.extra_rewards_apy
+        total_apy = pool.total_apy_range
+        
+        lines.append(f"{i}. {pool.name}")
+        lines.append(f"   Base CRV APY:   [{gauge_apy[0]:.2f}%, {gauge_apy[1]:.2f}%]")
+        lines.append(f"   Extra APY:      {extra_apy:.2f}%")
+        lines.append(f"   Total APY:      [{total_apy[0]:.2f}%, {total_apy[1]:.2f}%]")
+        lines.append(f"   Max Total APY:  {pool.max_apy:.2f}%")
+        lines.append(f"   USD Total:      ${pool.usd_total:,.2f}")
+        lines.append(f"   Type:           {pool_info.get('type', 'unknown')}")
+        lines.append(f"   Blockchain:     {pool_info.get('blockchainId', 'unknown')}")
         
         # Show pool URLs if available
         pool_urls = pool_info.get('poolUrls', {})
         if pool_urls:
             swap_urls = pool_urls.get('swap', [])
             if swap_urls:
-                print(f"   Swap URL:       {swap_urls[0]}")
+                lines.append(f"   Swap URL:       {swap_urls[0]}")
         
-        print("-" * 80)
+        lines.append("-" * 80)
+    
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 def main():
     """Main function to run the script."""
@@ -198,8 +425,7 @@ def main():
     if high_apy_pools:
         output_file = os.path.join(script_dir, "high_apy_stable_pools_1m_plus.json")
         try:
-            with open(output_file, 'w') as f:
-                json.dump(high_apy_pools, f, indent=2)
+            _dump_json([pool.to_dict() for pool in high_apy_pools], output_file)
             print(f"\nResults saved to: {output_file}")
         except Exception as e:
             print(f"Error saving results: {e}")